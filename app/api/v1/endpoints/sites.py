@@ -6,6 +6,7 @@ from app.schemas.nginx import (
 )
 import os
 from app.core.logger import setup_logger
+from app.utils.nginx import get_site_root_path
 
 router = APIRouter()
 deploy_service = DeployService()    
@@ -60,7 +61,7 @@ async def list_sites():
                         "ssl_enabled": site_info.ssl_enabled,
                         "proxy_port": site_info.proxy_port,
                         "config_file": f"{conf_dir}/{conf_file}",
-                        "root_path": f"/var/www/{domain}"
+                        "root_path": get_site_root_path(domain)
                     })
         logger.info(f"[站点列表] 成功 - 共获取到 {len(sites)} 个站点")
         return sites
@@ -107,7 +108,7 @@ async def get_site(domain: str):
             "ssl_enabled": site.ssl_enabled,
             "proxy_port": site.proxy_port,
             "config_file": f"/etc/nginx/conf.d/{domain}.conf",
-            "root_path": f"/var/www/{domain}",
+            "root_path": get_site_root_path(domain),
             "ssl_info": site.ssl_info.dict() if site.ssl_info else None
         }
         logger.info(f"获取站点详情成功: {result}")
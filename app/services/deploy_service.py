@@ -1,15 +1,32 @@
 import os
+import shutil
+import asyncio
 from typing import Optional
 from app.services.nginx_service import NginxService
 from app.services.ssl_service import SSLService
 from app.schemas.deploy import DeployRequest, DeployResponse
 from app.schemas.nginx import NginxSite, SSLInfo
+from app.utils.nginx import get_site_root_path
 from app.core.logger import setup_logger
 import aiofiles
 import re
 
 logger = setup_logger(__name__)
 
+def _remove_site_root(path: str):
+    """删除站点目录；若为符号链接则只删除链接本身，不删除链接目标"""
+    if os.path.islink(path):
+        _remove_file(path)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+
+def _remove_file(path: str):
+    """删除文件，文件不存在时忽略"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
 class DeployService:
     """部署服务实现"""
     
@@ -51,7 +68,7 @@ class DeployService:
             # 创建Nginx站点配置
             site = NginxSite(
                 domain=request.domain,
-                root_path=f"/var/www/{request.domain}",
+                root_path=get_site_root_path(request.domain),
                 ssl_enabled=request.enable_ssl,
                 ssl_info=ssl_info,
                 proxy_port=request.proxy_port,
@@ -75,21 +92,31 @@ class DeployService:
     async def remove_site(self, domain: str) -> DeployResponse:
         """移除站点"""
         try:
-            # 删除Nginx配置
             config_path = f"/etc/nginx/conf.d/{domain}.conf"
-            if os.path.exists(config_path):
-                os.remove(config_path)
-                
-            # 删除站点目录
-            site_root = f"/var/www/{domain}"
-            if os.path.exists(site_root):
-                os.system(f"rm -rf {site_root}")
-                
-            # 如果有SSL证书，删除证书
-            await self.ssl_service.delete_certificate(domain)
+            site_root = get_site_root_path(domain)
+            loop = asyncio.get_event_loop()
             
-            # 重启Nginx
-            await self.nginx_service.restart_nginx()
+            # 删除Nginx配置、站点目录和SSL证书(互不依赖，并发执行)
+            tasks = [
+                loop.run_in_executor(None, _remove_file, config_path),
+                loop.run_in_executor(None, _remove_site_root, site_root)
+            ]
+            # 站点没有证书时无需调用certbot(否则certbot会返回失败)
+            if self.ssl_service.certificate_exists(domain):
+                tasks.append(self.ssl_service.delete_certificate(domain))
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            errors = [str(result) for result in results if isinstance(result, Exception)]
+            
+            # 只要配置文件已删除就重载Nginx，使已删除站点的server块失效
+            if not os.path.exists(config_path):
+                await self.nginx_service.reload_nginx()
+            
+            if errors:
+                self.logger.error(f"删除站点失败: {'; '.join(errors)}")
+                return DeployResponse(
+                    success=False,
+                    message=f"删除失败: {'; '.join(errors)}"
+                )
             
             return DeployResponse(
                 success=True,
@@ -137,7 +164,7 @@ class DeployService:
             
             return NginxSite(
                 domain=domain,
-                root_path=f"/var/www/{domain}",
+                root_path=get_site_root_path(domain),
                 ssl_enabled=ssl_enabled,
                 ssl_info=ssl_info,
                 proxy_port=proxy_port
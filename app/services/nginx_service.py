@@ -1,15 +1,148 @@
 import os
-import aiofiles
-from typing import Dict, Any, Optional
+import re
+import pwd
+import shutil
+import asyncio
+import tempfile
+import functools
+from typing import Dict, Any, Optional, List, Tuple
 from app.schemas.nginx import NginxSite, NginxResponse, SSLInfo
-from app.utils.shell import run_command
+from app.utils.shell import run_argv
+from app.utils.nginx import (
+    get_nginx_user,
+    get_site_root_path,
+    ensure_within_www_root,
+    verify_nginx_config
+)
+from app.core.config import settings
 from app.core.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Nginx主配置文件
+_NGINX_MAIN_CONF = "/etc/nginx/nginx.conf"
+
+# 站点配置模板(nginx变量使用$，因此采用%格式化)
+# HTTP配置(用于SSL验证重定向)
+_HTTP_SERVER_TEMPLATE = """
+server {
+    listen 80;
+    listen [::]:80;
+    server_name %s;
+    
+    # Let's Encrypt验证目录
+    location /.well-known/acme-challenge/ {
+        root %s;
+        allow all;
+    }
+    
+    # 如果启用了SSL，重定向到HTTPS
+    %s
+}
+"""
+
+# HTTPS配置
+_HTTPS_SERVER_TEMPLATE = """
+server {
+    listen 443 ssl http2;
+    listen [::]:443 ssl http2;
+    server_name %s;
+
+    # SSL配置
+    ssl_certificate %s;
+    ssl_certificate_key %s;
+    ssl_protocols TLSv1.2 TLSv1.3;
+    ssl_ciphers ECDHE-ECDSA-AES128-GCM-SHA256:ECDHE-RSA-AES128-GCM-SHA256:ECDHE-ECDSA-AES256-GCM-SHA384:ECDHE-RSA-AES256-GCM-SHA384:ECDHE-ECDSA-CHACHA20-POLY1305:ECDHE-RSA-CHACHA20-POLY1305:DHE-RSA-AES128-GCM-SHA256:DHE-RSA-AES256-GCM-SHA384;
+    ssl_prefer_server_ciphers off;
+    ssl_session_timeout 1d;
+    ssl_session_cache shared:SSL:50m;
+    ssl_stapling on;
+    ssl_stapling_verify on;
+    add_header Strict-Transport-Security "max-age=31536000" always;
+
+    # 反向代理配置
+    location / {
+        proxy_pass http://%s:%d;
+        proxy_set_header Host %s;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+        
+        # WebSocket支持
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection "upgrade";
+        
+        # 超时设置
+        proxy_connect_timeout 60s;
+        proxy_send_timeout 60s;
+        proxy_read_timeout 60s;
+    }
+
+    # 添加自定义配置
+    %s
+}
+"""
+
+# 配置文件权限
+_CONFIG_MODE = 0o644
+
+@functools.lru_cache(maxsize=None)
+def _resolve_owner(user: str) -> Tuple[int, int]:
+    """解析用户及其主组对应的uid/gid(系统用户在进程生命周期内不变，结果缓存)"""
+    entry = pwd.getpwnam(user)
+    return entry.pw_uid, entry.pw_gid
+
+def _write_file_sync(path: str, content: str, uid: int, gid: int) -> None:
+    # 先写入同目录下的临时文件(后缀不为.conf，不会被nginx include)，
+    # 完成后再原子替换目标文件，任何一步失败都不会破坏原有配置
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(path)}.",
+        suffix=".tmp",
+        dir=os.path.dirname(path)
+    )
+    try:
+        with os.fdopen(fd, 'w') as f:
+            # 直接在文件描述符上设置属主和权限，无需额外的chown/chmod进程
+            os.fchown(fd, uid, gid)
+            os.fchmod(fd, _CONFIG_MODE)
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+async def _write_file(path: str, content: str, uid: int, gid: int) -> None:
+    """在线程池中一次性完成写入、设置权限和替换文件"""
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, _write_file_sync, path, content, uid, gid)
+
+def _read_file_sync(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+async def _write_file_if_changed(path: str, content: str, uid: int, gid: int) -> bool:
+    """内容与现有文件不同时才写入，返回是否写入"""
+    loop = asyncio.get_event_loop()
+    existing = await loop.run_in_executor(None, _read_file_sync, path)
+    if existing == content:
+        return False
+    await _write_file(path, content, uid, gid)
+    return True
+
 class NginxService:
     """Nginx服务管理"""
 
+    async def _get_owner(self) -> Tuple[int, int]:
+        """获取站点文件属主的uid/gid(Nginx运行用户)"""
+        return _resolve_owner(await get_nginx_user())
+
     async def create_site(self, site: NginxSite) -> NginxResponse:
         """创建站点配置"""
         try:
@@ -21,26 +154,28 @@ class NginxService:
                 )
             
             # 确保站点目录存在
-            site_root = f"/var/www/{site.domain}"
+            site_root = get_site_root_path(site.domain)
             os.makedirs(site_root, exist_ok=True)
-            await run_command(f"chown -R nginx:nginx {site_root}")
-            await run_command(f"chmod -R 755 {site_root}")
+            # 后续会递归修改属主和权限，须确保目录(含符号链接目标)位于WWW_ROOT之下
+            ensure_within_www_root(site_root)
+            uid, gid = await self._get_owner()
             
             # 生成配置文件
             config_content = self._generate_site_config(site)
             config_path = f"/etc/nginx/conf.d/{site.domain}.conf"
             
-            # 写入配置文件
-            async with aiofiles.open(config_path, 'w') as f:
-                await f.write(config_content)
+            # 写入配置文件(写入时同时设置属主和权限，内容未变化时跳过)
+            await _write_file_if_changed(config_path, config_content, uid, gid)
             
-            # 设置配置文件权限
-            await run_command(f"chown nginx:nginx {config_path}")
-            await run_command(f"chmod 644 {config_path}")
+            # 设置站点目录权限(互不依赖，并发执行)
+            await asyncio.gather(
+                run_argv("chown", "-R", f"{uid}:{gid}", site_root),
+                run_argv("chmod", "-R", "755", site_root)
+            )
             
             # 测试配置
             try:
-                await run_command("nginx -t")
+                await run_argv("nginx", "-t")
             except Exception as e:
                 logger.error(f"Nginx配置测试失败: {str(e)}")
                 if os.path.exists(config_path):
@@ -64,27 +199,198 @@ class NginxService:
             logger.error(f"创建站点失败: {str(e)}")
             raise
 
+    async def create_sites(self, sites: List[NginxSite]) -> NginxResponse:
+        """批量创建站点配置(统一设置权限、测试配置并只重载一次Nginx)"""
+        try:
+            if not sites:
+                return NginxResponse(
+                    success=False,
+                    message="未提供站点配置"
+                )
+            
+            # 检查SSL配置
+            for site in sites:
+                if site.ssl_enabled and site.ssl_info is None:
+                    return NginxResponse(
+                        success=False,
+                        message=f"站点 {site.domain} 启用SSL但未提供证书信息"
+                    )
+            
+            # 同一批次中域名不能重复
+            domains = [site.domain for site in sites]
+            duplicates = sorted({domain for domain in domains if domains.count(domain) > 1})
+            if duplicates:
+                return NginxResponse(
+                    success=False,
+                    message=f"站点域名重复: {', '.join(duplicates)}"
+                )
+            
+            # 写入任何文件前先校验所有站点目录(后续会递归修改属主和权限)
+            site_roots = [get_site_root_path(site.domain) for site in sites]
+            for site_root in site_roots:
+                ensure_within_www_root(site_root)
+            
+            uid, gid = await self._get_owner()
+            config_paths = []
+            for site, site_root in zip(sites, site_roots):
+                # 确保站点目录存在
+                os.makedirs(site_root, exist_ok=True)
+                
+                # 写入配置文件(写入时同时设置属主和权限，内容未变化时跳过)
+                config_path = f"/etc/nginx/conf.d/{site.domain}.conf"
+                await _write_file_if_changed(config_path, self._generate_site_config(site), uid, gid)
+                config_paths.append(config_path)
+            
+            # 一次性设置所有站点目录权限(参数直接传给程序，不经过shell解析)
+            await run_argv("chown", "-R", f"{uid}:{gid}", *site_roots)
+            await run_argv("chmod", "-R", "755", *site_roots)
+            
+            # 整批写入完成后只测试一次配置
+            invalid_paths = []
+            try:
+                await run_argv("nginx", "-t")
+            except Exception as e:
+                logger.error(f"Nginx配置测试失败: {str(e)}")
+                # 二分定位无效配置，仅移除无效站点
+                try:
+                    invalid_paths = await self._find_invalid_configs(config_paths)
+                except Exception as bisect_error:
+                    logger.error(f"定位无效配置失败: {str(bisect_error)}")
+                    invalid_paths = None
+                if invalid_paths is not None and len(invalid_paths) < len(config_paths):
+                    self._remove_configs(invalid_paths)
+                    if not await verify_nginx_config():
+                        invalid_paths = None
+                if invalid_paths is None or len(invalid_paths) == len(config_paths):
+                    self._remove_configs(config_paths)
+                    raise
+                logger.warning(f"以下站点配置无效，已跳过: {', '.join(invalid_paths)}")
+            
+            # 重载Nginx配置(失败时回退为重启)
+            await self.reload_nginx()
+            
+            created = [
+                {
+                    "domain": site.domain,
+                    "config_file": config_path,
+                    "root_path": site_root
+                }
+                for site, config_path, site_root in zip(sites, config_paths, site_roots)
+                if config_path not in invalid_paths
+            ]
+            failed = [
+                site.domain
+                for site, config_path in zip(sites, config_paths)
+                if config_path in invalid_paths
+            ]
+            message = f"{len(created)} 个站点创建成功"
+            if failed:
+                message += f"，{len(failed)} 个站点配置无效"
+            return NginxResponse(
+                success=True,
+                message=message,
+                data={
+                    "sites": created,
+                    "failed_sites": failed
+                }
+            )
+            
+        except Exception as e:
+            logger.error(f"批量创建站点失败: {str(e)}")
+            raise
+
+    def _remove_configs(self, config_paths: List[str]):
+        """删除配置文件"""
+        for config_path in config_paths:
+            if os.path.exists(config_path):
+                os.remove(config_path)
+
+    async def _find_invalid_configs(self, config_paths: List[str]) -> Optional[List[str]]:
+        """
+        二分定位导致nginx -t失败的配置文件
+        
+        不改动线上配置：每组候选配置以符号链接放入临时目录，并用改写了conf.d
+        include的临时主配置执行 nginx -t -c 测试。定位单个无效配置约需 2·log2(N) 次
+        nginx -t，另加一次不含本批配置的基线测试。
+        
+        Returns:
+            无效配置列表；若不含本批配置时测试仍失败(问题不在本批配置中)、
+            主配置中找不到conf.d的include或临时测试环境搭建失败，则返回None
+        """
+        conf_dir = settings.NGINX_CONF_DIR.rstrip('/')
+        nginx_dir = os.path.dirname(_NGINX_MAIN_CONF)
+        try:
+            with open(_NGINX_MAIN_CONF) as f:
+                main_conf = f.read()
+        except OSError as e:
+            logger.error(f"读取Nginx主配置失败: {str(e)}")
+            return None
+        include_pattern = re.compile(
+            r"include\s+(?:%s|%s)/\*\.conf\s*;" % (
+                re.escape(conf_dir),
+                re.escape(os.path.relpath(conf_dir, nginx_dir))
+            )
+        )
+        if not include_pattern.search(main_conf):
+            logger.warning(f"Nginx主配置中未找到 {conf_dir}/*.conf 的include，无法定位无效配置")
+            return None
+        
+        # 同一配置只需测试一次，重复路径会导致创建符号链接失败
+        config_paths = list(dict.fromkeys(config_paths))
+        
+        async def test(paths: List[str]) -> bool:
+            include_dir = tempfile.mkdtemp(dir=work_dir)
+            for path in other_paths + paths:
+                os.symlink(path, os.path.join(include_dir, os.path.basename(path)))
+            # 临时主配置放在nginx目录下，保证mime.types等相对include路径仍然有效
+            fd, test_conf = tempfile.mkstemp(prefix=".bisect-", suffix=".conf", dir=nginx_dir)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(include_pattern.sub(lambda _: f"include {include_dir}/*.conf;", main_conf))
+                try:
+                    await run_argv("nginx", "-t", "-c", test_conf)
+                    return True
+                except Exception:
+                    return False
+            finally:
+                os.remove(test_conf)
+        
+        async def search(paths: List[str]) -> List[str]:
+            if await test(paths):
+                return []
+            if len(paths) == 1:
+                return paths
+            middle = len(paths) // 2
+            invalid = await search(paths[:middle]) + await search(paths[middle:])
+            # 两半单独都有效但合并后无效(配置间冲突)，视为整组无效
+            return invalid or paths
+        
+        work_dir = None
+        try:
+            batch = set(config_paths)
+            other_paths = [
+                os.path.join(conf_dir, name)
+                for name in sorted(os.listdir(conf_dir))
+                if name.endswith('.conf') and os.path.join(conf_dir, name) not in batch
+            ]
+            work_dir = tempfile.mkdtemp(prefix=".bisect-", dir=nginx_dir)
+            if not await test([]):
+                return None
+            return await search(config_paths)
+        except OSError as e:
+            # 临时测试环境搭建失败(非配置本身问题)，视为无法定位
+            logger.error(f"定位无效配置失败: {str(e)}")
+            return None
+        finally:
+            if work_dir is not None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
     def _generate_site_config(self, site: NginxSite) -> str:
         """生成站点配置"""
         config = ""
         
         # HTTP配置(用于SSL验证重定向)
-        http_config = """
-server {
-    listen 80;
-    listen [::]:80;
-    server_name %s;
-    
-    # Let's Encrypt验证目录
-    location /.well-known/acme-challenge/ {
-        root %s;
-        allow all;
-    }
-    
-    # 如果启用了SSL，重定向到HTTPS
-    %s
-}
-""" % (
+        http_config = _HTTP_SERVER_TEMPLATE % (
             site.domain,
             site.root_path,
             "return 301 https://$server_name$request_uri;" if site.ssl_enabled else f"return 301 http://$server_name:{site.proxy_port}$request_uri;"
@@ -94,47 +400,7 @@ server {
 
         # 如果启用了SSL，添加HTTPS配置
         if site.ssl_enabled and site.ssl_info:
-            https_config = """
-server {
-    listen 443 ssl http2;
-    listen [::]:443 ssl http2;
-    server_name %s;
-
-    # SSL配置
-    ssl_certificate %s;
-    ssl_certificate_key %s;
-    ssl_protocols TLSv1.2 TLSv1.3;
-    ssl_ciphers ECDHE-ECDSA-AES128-GCM-SHA256:ECDHE-RSA-AES128-GCM-SHA256:ECDHE-ECDSA-AES256-GCM-SHA384:ECDHE-RSA-AES256-GCM-SHA384:ECDHE-ECDSA-CHACHA20-POLY1305:ECDHE-RSA-CHACHA20-POLY1305:DHE-RSA-AES128-GCM-SHA256:DHE-RSA-AES256-GCM-SHA384;
-    ssl_prefer_server_ciphers off;
-    ssl_session_timeout 1d;
-    ssl_session_cache shared:SSL:50m;
-    ssl_stapling on;
-    ssl_stapling_verify on;
-    add_header Strict-Transport-Security "max-age=31536000" always;
-
-    # 反向代理配置
-    location / {
-        proxy_pass http://%s:%d;
-        proxy_set_header Host %s;
-        proxy_set_header X-Real-IP $remote_addr;
-        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
-        proxy_set_header X-Forwarded-Proto $scheme;
-        
-        # WebSocket支持
-        proxy_http_version 1.1;
-        proxy_set_header Upgrade $http_upgrade;
-        proxy_set_header Connection "upgrade";
-        
-        # 超时设置
-        proxy_connect_timeout 60s;
-        proxy_send_timeout 60s;
-        proxy_read_timeout 60s;
-    }
-
-    # 添加自定义配置
-    %s
-}
-""" % (
+            https_config = _HTTPS_SERVER_TEMPLATE % (
                 site.domain,
                 site.ssl_info.cert_path,
                 site.ssl_info.key_path,
@@ -147,11 +413,20 @@ server {
 
         return config
 
+    async def reload_nginx(self):
+        """平滑重载Nginx配置，失败时回退为重启服务"""
+        try:
+            await run_argv("nginx", "-s", "reload")
+            logger.info("Nginx配置重载成功")
+        except Exception as e:
+            logger.warning(f"Nginx配置重载失败，尝试重启服务: {str(e)}")
+            await self.restart_nginx()
+
     async def restart_nginx(self):
         """重启Nginx服务"""
         try:
-            await run_command("systemctl restart nginx")
-            await run_command("sleep 2")  # 等待服务启动
+            await run_argv("systemctl", "restart", "nginx")
+            await asyncio.sleep(2)  # 等待服务启动
             logger.info("Nginx服务重启成功")
         except Exception as e:
             logger.error(f"Nginx服务重启失败: {str(e)}")
@@ -1,5 +1,5 @@
 from typing import Optional, Dict, Any
-from app.utils.shell import run_command
+from app.utils.shell import run_argv
 from app.core.logger import setup_logger
 import os
 import asyncio
@@ -8,6 +8,30 @@ import socket
 
 logger = setup_logger(__name__)
 
+# 共享的HTTP会话，复用连接(keep-alive)
+_SESSION: Optional[aiohttp.ClientSession] = None
+_SESSION_LOCK: Optional[asyncio.Lock] = None
+_CONNECTION_LIMIT = 20
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """获取共享的HTTP会话(首次调用时创建)"""
+    global _SESSION, _SESSION_LOCK
+    if _SESSION_LOCK is None:
+        _SESSION_LOCK = asyncio.Lock()
+    async with _SESSION_LOCK:
+        if _SESSION is None or _SESSION.closed:
+            _SESSION = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=_CONNECTION_LIMIT)
+            )
+    return _SESSION
+
+async def close_http_session():
+    """关闭共享的HTTP会话"""
+    global _SESSION
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+
 class SSLService:
     """SSL证书服务"""
 
@@ -42,7 +66,7 @@ class SSLService:
             )
 
             # 临时停止Nginx
-            await run_command("systemctl stop nginx")
+            await run_argv("systemctl", "stop", "nginx")
             self.logger.info("Nginx服务已停止，准备申请证书")
 
             try:
@@ -80,7 +104,7 @@ class SSLService:
             finally:
                 # 重���启动Nginx
                 try:
-                    await run_command("systemctl start nginx")
+                    await run_argv("systemctl", "start", "nginx")
                     self.logger.info("Nginx服务已重新启动")
                 except Exception as e:
                     self.logger.error(f"重启Nginx失败: {str(e)}")
@@ -117,9 +141,9 @@ class SSLService:
     async def _get_server_ip(self) -> Optional[str]:
         """获取服��器公网IP"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get('https://api.ipify.org') as response:
-                    return await response.text()
+            session = await get_http_session()
+            async with session.get('https://api.ipify.org') as response:
+                return await response.text()
         except Exception as e:
             self.logger.error(f"获取服务器IP失败: {str(e)}")
             return None
@@ -127,15 +151,21 @@ class SSLService:
     async def _get_domain_ip(self, domain: str) -> Optional[str]:
         """获取域名解析IP"""
         try:
-            return socket.gethostbyname(domain)
+            loop = asyncio.get_event_loop()
+            infos = await loop.getaddrinfo(domain, None, family=socket.AF_INET)
+            return infos[0][4][0] if infos else None
         except Exception as e:
             self.logger.error(f"获取域名IP失败: {str(e)}")
             return None
 
+    def certificate_exists(self, domain: str) -> bool:
+        """检查certbot中是否存在该域名的证书(以续期配置文件为准)"""
+        return os.path.exists(f"/etc/letsencrypt/renewal/{domain}.conf")
+
     async def delete_certificate(self, domain: str) -> Dict[str, Any]:
         """删除SSL证书"""
         try:
-            await run_command(f"certbot delete --cert-name {domain} -n")
+            await run_argv("certbot", "delete", "--cert-name", domain, "-n")
             return {
                 "success": True,
                 "message": f"证书 {domain} 已删除"
@@ -148,7 +178,7 @@ class SSLService:
          
         """验证域名DNS是否已解析"""
         try:
-            result = await run_command(f"dig +short {domain}")
-            return bool(result.strip())
+            loop = asyncio.get_event_loop()
+            return bool(await loop.getaddrinfo(domain, None))
         except:
             return False
\ No newline at end of file
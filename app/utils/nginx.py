@@ -1,30 +1,90 @@
 from typing import Optional
 import os
+import pwd
+import functools
 from app.core.config import settings
 from app.core.logger import setup_logger
 from app.core.exceptions import NginxError
-from app.utils.shell import run_command
+from app.utils.shell import run_argv
 
 logger = setup_logger(__name__)
 
+# Nginx运行用户在进程生命周期内不会变化，首次探测后缓存
+_nginx_user_cache: Optional[str] = None
+
+# nginx未运行时按顺序尝试的系统用户(RedHat系为nginx，Debian系为www-data)
+_NGINX_USER_CANDIDATES = ('nginx', 'www-data')
+
 async def verify_nginx_config() -> bool:
     """验证Nginx配置"""
     try:
-        await run_command("nginx -t")
+        await run_argv("nginx", "-t")
         return True
     except Exception as e:
         logger.error(f"Nginx配置验证失败: {str(e)}")
         return False
 
-async def get_nginx_user() -> str:
-    """获取Nginx运行用户"""
+def _find_nginx_process_user() -> Optional[str]:
+    """扫描/proc查找nginx进程的属主，优先返回worker进程(非root)用户"""
+    owner = None
     try:
-        result = await run_command("ps aux | grep 'nginx: master' | grep -v grep | awk '{print $1}' | head -n1")
-        if result:
-            return result.strip()
-        return 'nginx'
-    except:
-        return 'nginx'
+        pids = [pid for pid in os.listdir('/proc') if pid.isdigit()]
+    except OSError:
+        return None
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/comm') as f:
+                if f.read().strip() != 'nginx':
+                    continue
+            uid = os.stat(f'/proc/{pid}').st_uid
+            name = pwd.getpwuid(uid).pw_name
+        except (OSError, KeyError):
+            # 进程已退出或uid无对应用户
+            continue
+        if uid != 0:
+            return name
+        owner = owner or name
+    return owner
+
+def _find_existing_user() -> Optional[str]:
+    """通过pwd查找已存在的nginx候选系统用户"""
+    for name in _NGINX_USER_CANDIDATES:
+        try:
+            pwd.getpwnam(name)
+            return name
+        except KeyError:
+            continue
+    return None
+
+async def get_nginx_user() -> str:
+    """获取Nginx运行用户(仅缓存从运行中的nginx进程探测到的结果)"""
+    global _nginx_user_cache
+    if _nginx_user_cache is not None:
+        return _nginx_user_cache
+    user = _find_nginx_process_user()
+    if user is None:
+        # nginx未运行时只返回候选用户而不缓存，nginx启动后可重新探测到实际运行用户
+        return _find_existing_user() or 'nginx'
+    _nginx_user_cache = user
+    return user
+
+@functools.lru_cache(maxsize=256)
+def get_site_root_path(domain: str) -> str:
+    """获取站点根目录(校验域名为单个安全路径段)"""
+    if not domain or domain in ('.', '..') or '/' in domain or '\0' in domain:
+        raise NginxError(f"无效的域名: {domain!r}")
+    return f"{settings.WWW_ROOT.rstrip('/')}/{domain}"
+
+def ensure_within_www_root(site_root: str):
+    """
+    确保站点目录解析符号链接后仍位于WWW_ROOT之下
+    
+    仅在递归修改属主/权限前调用；文件系统状态可能变化，因此不缓存。
+    """
+    www_root = os.path.realpath(settings.WWW_ROOT)
+    resolved = os.path.realpath(site_root)
+    if resolved == www_root or os.path.commonpath([resolved, www_root]) != www_root:
+        raise NginxError(f"站点目录不在 {settings.WWW_ROOT} 之下: {site_root}")
 
 def ensure_nginx_dirs():
     """确保Nginx必要目录存在"""
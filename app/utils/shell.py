@@ -4,6 +4,28 @@ from app.core.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+async def _communicate(
+    process: asyncio.subprocess.Process,
+    command: str,
+    check: bool,
+    timeout: int
+) -> str:
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            process.communicate(),
+            timeout=timeout
+        )
+    except asyncio.TimeoutError:
+        if process.returncode is None:
+            process.kill()
+        raise TimeoutError(f"命令执行超时: {command}")
+        
+    if check and process.returncode != 0:
+        error_msg = stderr.decode().strip()
+        raise RuntimeError(f"命令执行失败: {error_msg}")
+        
+    return stdout.decode().strip()
+
 async def run_command(
     command: str,
     check: bool = True,
@@ -27,23 +49,38 @@ async def run_command(
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
+        return await _communicate(process, command, check, timeout)
         
-        try:
-            stdout, stderr = await asyncio.wait_for(
-                process.communicate(),
-                timeout=timeout
-            )
-        except asyncio.TimeoutError:
-            if process.returncode is None:
-                process.kill()
-            raise TimeoutError(f"命令执行超时: {command}")
-            
-        if check and process.returncode != 0:
-            error_msg = stderr.decode().strip()
-            raise RuntimeError(f"命令执行失败: {error_msg}")
-            
-        return stdout.decode().strip()
+    except Exception as e:
+        logger.error(f"命令执行失败: {str(e)}")
+        raise
+
+async def run_argv(
+    *args: str,
+    check: bool = True,
+    timeout: int = 60
+) -> str:
+    """
+    不经过shell直接执行命令(无需管道、重定向等shell语法时使用)
+    
+    Args:
+        args: 程序及参数
+        check: 是否检查返回值
+        timeout: 超时时间(秒)
+    
+    Returns:
+        命令输出
+    """
+    command = " ".join(args)
+    try:
+        logger.debug(f"执行命令: {command}")
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        return await _communicate(process, command, check, timeout)
         
     except Exception as e:
         logger.error(f"命令执行失败: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
\ No newline at end of file
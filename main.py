@@ -5,6 +5,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.endpoints import deploy, ssl
 from app.core.config import settings
 from app.utils.shell import run_command
+from app.services.ssl_service import close_http_session
 from app.core.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -43,6 +44,11 @@ async def startup_event():
     os.makedirs(settings.NGINX_CONF_DIR, exist_ok=True)
     os.makedirs(settings.WWW_ROOT, exist_ok=True)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放资源"""
+    await close_http_session()
+
 @app.get("/")
 async def root():
     return {